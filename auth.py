@@ -1,20 +1,32 @@
 # auth.py
 import streamlit as st
-from utils import hash_password, load_json, save_json, log_user_action
-from config import USER_FILE, HISTORY_FILE
+import pandas as pd
+from utils import hash_password, verify_password, password_needs_rehash, log_user_action
+from meta_store import load_users, add_user, set_user_password, delete_users
 import re
 
+# At least 8 characters with at least one letter and one digit
+_PWD_RE = re.compile(r"(?=.*[A-Za-z])(?=.*[0-9]).{8,}", re.DOTALL)
+
 def login_page():
     st.set_page_config(page_title="Login")
     st.title("Village Population Analytics Dashboard")
+
+    if not load_users():
+        _first_admin_form()
+        return
+
     st.markdown("### Login Required")
 
     username = st.text_input("Username")
     password = st.text_input("Password", type="password")
 
     if st.button("Login", type="primary"):
-        users = load_json(USER_FILE)
-        if username in users and users[username] == hash_password(password):
+        users = load_users()
+        if username in users and verify_password(users[username], password):
+            # Lazily migrate legacy SHA-256 digests to Argon2id
+            if password_needs_rehash(users[username]):
+                set_user_password(username, hash_password(password))
             st.session_state.authenticated = True
             st.session_state.username = username
             log_user_action(username, "LOGIN", "Login successful")
@@ -24,13 +36,28 @@ def login_page():
             log_user_action(username, "LOGIN_FAIL", "Invalid username or password")
             st.error("Invalid username or password")
 
-    with st.expander("First-time setup"):
-        st.info("Admin must create the first user via user management after manually creating users.json.")
+def _first_admin_form():
+    """Bootstrap: with no users yet, the first visitor sets the admin password."""
+    st.markdown("### First-time setup")
+    st.info("No users exist yet. Set a password for the **admin** account, then log in and add users via user management.")
+    with st.form("first_admin"):
+        pwd = st.text_input("Admin Password", type="password")
+        pwd2 = st.text_input("Confirm Password", type="password")
+        if st.form_submit_button("Create admin"):
+            if pwd != pwd2:
+                st.error("Passwords mismatch")
+            elif not _PWD_RE.fullmatch(pwd):
+                st.error("Password needs 8+ characters with letters + numbers")
+            else:
+                # add_user refuses if another visitor finished the setup first
+                if add_user("admin", hash_password(pwd)):
+                    log_user_action("admin", "USER_CREATE", "Created initial admin account")
+                st.rerun()
 
 def change_password_page():
     st.title("Change Password")
     user = st.session_state.username
-    users = load_json(USER_FILE)
+    users = load_users()
 
     with st.form("change_pwd"):
         st.write(f"Updating password for **{user}**")
@@ -40,17 +67,14 @@ def change_password_page():
         submitted = st.form_submit_button("Update")
 
         if submitted:
-            if hash_password(old) != users[user]:
+            if not verify_password(users[user], old):
                 st.error("Current password incorrect")
             elif new != confirm:
                 st.error("Passwords do not match")
-            elif len(new) < 8:
-                st.error("Password must be at least 8 characters")
-            elif not (re.search(r"[A-Za-z]", new) and re.search(r"[0-9]", new)):
-                st.error("Password must contain letters and numbers")
+            elif not _PWD_RE.fullmatch(new):
+                st.error("Password must be at least 8 characters and contain letters and numbers")
             else:
-                users[user] = hash_password(new)
-                save_json(users, USER_FILE)
+                set_user_password(user, hash_password(new))
                 log_user_action(user, "PASSWORD_CHANGE", "Password updated successfully")
                 st.success("Password changed successfully!")
                 st.balloons()
@@ -63,23 +87,27 @@ def change_password_page():
 
 def user_management_page():
     st.title("User Management (Admin Only)")
-    users = load_json(USER_FILE).copy()
-    history = load_json(HISTORY_FILE)
-
-    for user in list(users.keys()):
-        c1, c2, c3 = st.columns([3, 2, 1])
-        c1.write(f"**{user}**")
-        if user != "admin":
-            if c3.button("Delete", key=f"del_{user}"):
-                users.pop(user)
-                history.pop(user, None)
-                save_json(users, USER_FILE)
-                save_json(history, HISTORY_FILE)
+    users = load_users()
+
+    # One editor for all users; deletions are applied in a single batch
+    st.caption("**admin** (protected)")
+    deletable = [user for user in users if user != "admin"]
+    if deletable:
+        edited_df = st.data_editor(
+            pd.DataFrame({"user": deletable, "delete": [False] * len(deletable)}),
+            disabled=["user"],
+            hide_index=True,
+            use_container_width=True,
+            key="user_editor"
+        )
+        to_delete = edited_df.loc[edited_df["delete"], "user"].tolist()
+
+        if to_delete and st.button(f"Delete ({len(to_delete)}) Users", type="primary"):
+            delete_users(to_delete)
+            for user in to_delete:
                 log_user_action(st.session_state.username, "USER_DELETE", f"Deleted user: {user}")
-                st.success(f"User `{user}` deleted")
-                st.rerun()
-        else:
-            c2.write("(protected)")
+            st.success(f"Deleted {len(to_delete)} users")
+            st.rerun()
 
     st.markdown("---")
     st.subheader("Add New User")
@@ -94,13 +122,12 @@ def user_management_page():
                 st.error("Username exists")
             elif new_p != new_p2:
                 st.error("Passwords mismatch")
-            elif len(new_p) < 8:
-                st.error("Password too short")
-            elif not (re.search(r"[A-Za-z]", new_p) and re.search(r"[0-9]", new_p)):
-                st.error("Needs letters + numbers")
+            elif not _PWD_RE.fullmatch(new_p):
+                st.error("Password needs 8+ characters with letters + numbers")
+            elif not add_user(new_u, hash_password(new_p)):
+                # Created meanwhile by another session; never overwrite an existing password
+                st.error("Username exists")
             else:
-                users[new_u] = hash_password(new_p)
-                save_json(users, USER_FILE)
                 log_user_action(st.session_state.username, "USER_CREATE", f"Created user: {new_u}")
                 st.success(f"User `{new_u}` created!")
                 st.balloons()
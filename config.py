@@ -1,15 +1,28 @@
 # config.py
 import os
+import tempfile
 
 BASE_EXCEL = "FINAL_POPULATION.xlsx"
 BASE_PARQUET = "base_population.parquet"
-USER_FILE = "users.json"
-HISTORY_FILE = "user_history.json"
-LOG_FILE = "logs.json"
+USER_FILE = "users.json"  # legacy, imported into META_DB on first run
+HISTORY_FILE = "user_history.json"  # legacy, imported into META_DB on first run
+META_DB = "meta.db"
+LOG_FILE = "logs.json"  # legacy single-file log, copied into LOG_DIR on first run
+LOG_DIR = "logs"  # one NDJSON file per day: LOG_DIR/YYYY-MM-DD.ndjson
+LOG_RETENTION_DAYS = 90
+LOG_PAGE_SIZE = 1000  # newest log entries shown per "Load more" step
+
+# Generated databases live next to META_DB; history stores file names only
+DB_DIR = "databases"
+LEGACY_DB_DIR = os.path.join(tempfile.gettempdir(), "vdb_store")  # used by earlier versions
+DB_RETENTION_DAYS = 30
 
 MIN_VILLAGES = 28
 MAX_VILLAGES = 280
 
+# Names for population.DAY_OF_WEEK (0 = Monday)
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
 # Ensure required files exist (for base data)
 if not os.path.exists(BASE_EXCEL):
     raise FileNotFoundError(f"Required file '{BASE_EXCEL}' not found!")
\ No newline at end of file
@@ -1,44 +1,95 @@
 # database.py
 import streamlit as st
 import duckdb
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import uuid
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
+from pathlib import Path
 
-from config import BASE_EXCEL, BASE_PARQUET, HISTORY_FILE
-from utils import load_json, save_json, log_user_action
-from pop_utils import get_marriage_to_village_id
+from config import BASE_EXCEL, BASE_PARQUET, DB_DIR, LEGACY_DB_DIR, DB_RETENTION_DAYS
+from utils import log_user_action
+from meta_store import load_history, add_history_entry, remove_history_entry
 
-@st.cache_data(ttl=3600)
+@st.cache_resource(show_spinner=False)
 def load_base_data():
-    """Load the base data, converting to Parquet if needed for speed."""
+    """Load the base data as a shared, memory-mapped Arrow table, converting to Parquet if needed."""
     if not os.path.exists(BASE_PARQUET):
         if not os.path.exists(BASE_EXCEL):
             raise FileNotFoundError(f"Missing base file: {BASE_EXCEL}")
         
-        # One-time conversion
-        df = pd.read_excel(BASE_EXCEL, sheet_name="FINAL_POPULATION")
+        # One-time conversion (calamine is a Rust reader, much faster than openpyxl)
+        df = pd.read_excel(BASE_EXCEL, sheet_name="FINAL_POPULATION", engine="calamine")
         
-        # Pre-calculate birth dates once
-        df["BIRTH_DATE_SERIAL"] = df["BIRTH_DATE"].apply(
-            lambda x: (pd.to_datetime(x, errors='coerce') - pd.Timestamp("1899-12-30")).days
-            if pd.notna(x) else None
-        )
-        df["Date_of_Birth"] = df["BIRTH_DATE_SERIAL"].apply(
-            lambda x: (pd.Timestamp("1899-12-30") + pd.Timedelta(days=int(x))).strftime("%A, %B %d, %Y")
-            if pd.notna(x) else None
-        )
+        # Pre-calculate birth dates once (vectorized)
+        dt = pd.to_datetime(df["BIRTH_DATE"], errors="coerce")
+        df["BIRTH_DATE_SERIAL"] = (dt - pd.Timestamp("1899-12-30")).dt.days.astype("Int64")
+        df["Date_of_Birth"] = dt.dt.strftime("%A, %B %d, %Y")
         
-        df.to_parquet(BASE_PARQUET)
+        # Row index within a village (drives GENDER in generate_database)
+        df["idx"] = np.arange(len(df), dtype=np.int64)
+        
+        df.to_parquet(BASE_PARQUET, engine="pyarrow", compression="zstd", compression_level=3)
     
-    return pd.read_parquet(BASE_PARQUET)
+    table = pq.read_table(BASE_PARQUET, memory_map=True)
+    if "idx" not in table.column_names:
+        # Parquet files written before the idx column existed; added in memory, the file is left as is
+        table = table.append_column("idx", pa.array(np.arange(table.num_rows, dtype=np.int64)))
+    return table
+
+@st.cache_resource(show_spinner=False)
+def get_conn(db_path: str):
+    """Shared read-only connection per database file. Use .cursor() for each query."""
+    # DuckDB can't open a file read-write while this process holds it read-only,
+    # so the upgrade has to run before the shared connection exists
+    _upgrade_schema(db_path)
+    return duckdb.connect(db_path, read_only=True)
+
+def _upgrade_schema(db_path: str):
+    """Add columns missing from databases created by older versions."""
+    con = duckdb.connect(db_path)
+    try:
+        cols = [row[1] for row in con.execute("PRAGMA table_info(population)").fetchall()]
+        if "MARRIED_TO_VILLAGE_ID" not in cols:
+            con.execute("ALTER TABLE population ADD COLUMN MARRIED_TO_VILLAGE_ID INTEGER")
+        if "DAY_OF_WEEK" not in cols:
+            con.execute("ALTER TABLE population ADD COLUMN DAY_OF_WEEK TINYINT")
+            con.execute("UPDATE population SET DAY_OF_WEEK = isodow(DATE '1899-12-30' + BIRTH_DATE) - 1")
+    finally:
+        con.close()
+
+def resolve_db_path(db_path: str) -> str:
+    """Map a history db_path (a file name in DB_DIR) to its location on disk."""
+    for directory in (DB_DIR, LEGACY_DB_DIR):
+        stored = os.path.join(directory, db_path)
+        if os.path.exists(stored):
+            return stored
+    # Entries from before DB_DIR point at files in the working directory
+    return db_path
+
+def gc_old_dbs(days: int = DB_RETENTION_DAYS):
+    """Delete generated databases older than `days` and drop them from history."""
+    cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+    for username, entries in load_history().items():
+        for entry in entries:
+            if entry["created_at"] < cutoff:
+                path = resolve_db_path(entry["db_path"])
+                # Don't leave a cached connection to a file that no longer exists
+                get_conn.clear(path)
+                if os.path.exists(path):
+                    os.remove(path)
+                remove_history_entry(username, entry["db_path"])
 
 def generate_database(num_villages: int):
     """Generate a new DuckDB database for the current user using optimized vector operations."""
     username = st.session_state.username
     db_id = str(uuid.uuid4())[:8]
-    db_path = f"villages_{username}_{db_id}.db"
+    db_name = f"villages_{username}_{db_id}.db"
+    db_path = os.path.join(DB_DIR, db_name)
+    os.makedirs(DB_DIR, exist_ok=True)
 
     # Remove old file if exists
     if os.path.exists(db_path):
@@ -52,12 +103,9 @@ def generate_database(num_villages: int):
         # Connect to DuckDB
         con = duckdb.connect(db_path)
         
-        # Register the base dataframe
+        # Register the base Arrow table (scanned zero-copy by DuckDB)
         con.register("base_df", base_df)
         
-        # Create UDF for marriage mapping
-        con.create_function("get_marriage_id", get_marriage_to_village_id, return_type="BIGINT", parameters=["BIGINT", "BIGINT"])
-        
         # Create sequence and table
         con.execute("CREATE SEQUENCE seq START 1")
         con.execute("""
@@ -70,30 +118,52 @@ def generate_database(num_villages: int):
                 VILLAGE_ID INTEGER,
                 GENDER VARCHAR,
                 Date_of_Birth VARCHAR,
-                MARRIED_TO_VILLAGE_ID INTEGER
+                MARRIED_TO_VILLAGE_ID INTEGER,
+                DAY_OF_WEEK TINYINT
             )
         """)
         
         # Optimized SQL Generation
         # 1. Generate villages sequence
         # 2. Cross join with base data
-        # 3. Calculate fields in SQL/UDF
+        # 3. Calculate fields in SQL
         
         # Logic for GENDER:
         # "MALE" if (i % 2 == 0) == (vid % 2 == 1) else "FEMALE"
-        # i is row index within village. In base_df, we can rely on implicit row order or add a row_number.
-        # Let's add row_number to base_df via SQL
+        # i is row index within village, precomputed as base_df.idx in load_base_data.
+        
+        # Logic for DAY_OF_WEEK: 0 = Monday ... 6 = Sunday (see DAY_NAMES in config)
+        
+        # Logic for MARRIED_TO_VILLAGE_ID (closed form of pop_utils.get_marriage_to_village_id):
+        # c = (COUNTER - 1) % 196, block = c // 28
+        # add = 1 + 4 * block for the first two of every four positions, else 3 + 4 * block
+        # base = ((vid - 1) // 28) * 28, result = ((vid - base + add - 1) % 28) + 1 + base
+        # "add" depends only on the counter, so it comes from a 196-row lookup table joined
+        # to the base rows once; "base" is computed once per village.
+        c = np.arange(196, dtype=np.int32)
+        block = c // 28
+        add_lut = pd.DataFrame({
+            "counter_mod": c + 1,
+            "add": np.where(c % 4 < 2, 1 + 4 * block, 3 + 4 * block).astype(np.int32)
+        })
+        con.register("add_lut", add_lut)
         
         query = f"""
             INSERT INTO population (
                 COUNTER, FAMILY_ID, PERSON_ID, BIRTH_DATE, 
-                VILLAGE_ID, GENDER, Date_of_Birth, MARRIED_TO_VILLAGE_ID
+                VILLAGE_ID, GENDER, Date_of_Birth, MARRIED_TO_VILLAGE_ID, DAY_OF_WEEK
             )
-            WITH base_with_idx AS (
-                SELECT *, row_number() OVER () - 1 as idx FROM base_df
+            WITH villages AS (
+                SELECT range as vid, ((range - 1) // 28) * 28 as base 
+                FROM range(1, {num_villages} + 1)
             ),
-            villages AS (
-                SELECT range as vid FROM range(1, {num_villages} + 1)
+            base_rows AS (
+                SELECT 
+                    b.*, 
+                    a.add, 
+                    isodow(DATE '1899-12-30' + b.BIRTH_DATE_SERIAL::INTEGER) - 1 as DAY_OF_WEEK
+                FROM base_df b
+                JOIN add_lut a ON a.counter_mod = ((b.COUNTER - 1) % 196) + 1
             )
             SELECT 
                 b.COUNTER, 
@@ -106,9 +176,9 @@ def generate_database(num_villages: int):
                     ELSE 'FEMALE' 
                 END as GENDER,
                 b.Date_of_Birth,
-                get_marriage_id(v.vid, b.COUNTER) as MARRIED_TO_VILLAGE_ID
-            FROM villages v, base_with_idx b
-            ORDER BY v.vid, b.idx
+                ((v.vid - v.base + b.add - 1) % 28) + 1 + v.base as MARRIED_TO_VILLAGE_ID,
+                b.DAY_OF_WEEK
+            FROM villages v, base_rows b
         """
         
         con.execute(query)
@@ -128,38 +198,36 @@ def generate_database(num_villages: int):
     )
 
     # Save to user history
-    history = load_json(HISTORY_FILE)
-    history.setdefault(username, []).append({
+    add_history_entry(username, {
         "db_id": db_id,
-        "db_path": db_path,
+        "db_path": db_name,
         "num_villages": num_villages,
         "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     })
-    save_json(history, HISTORY_FILE)
-    st.session_state.history = history
+    st.session_state.history = load_history()
     
     # Log Action
     log_user_action(username, "GENERATE_DB", f"Created database with {num_villages} villages, {total_records:,} records")
 
     # Final success message + download button
-    st.success(f"Database created: `{db_path}` – {total_records:,} records")
+    st.success(f"Database created: `{db_name}` – {total_records:,} records")
     st.balloons()
-    with open(db_path, "rb") as f:
-        st.download_button("Download Database", f.read(), db_path, key="download_new_db")
+    # Callable data: the file is only read when the button is clicked
+    st.download_button("Download Database", data=Path(db_path).read_bytes, file_name=db_name, key="download_new_db")
 
 def load_db_from_history(path: str):
-    """Load a previously generated database from file path (called when user selects from history)."""
-    if os.path.exists(path):
-        st.session_state.db_path = path
-        st.session_state.db_generated = True
-        st.session_state.db_version += 1  # Trigger cache invalidation for visualizations
+    """Load a previously generated database from its history path (called when user selects from history)."""
+    full_path = resolve_db_path(path)
+    if os.path.exists(full_path):
+        # Called on every rerun while selected; only a new selection invalidates caches
+        if st.session_state.db_path != full_path:
+            st.session_state.db_path = full_path
+            st.session_state.db_generated = True
+            st.session_state.db_version += 1  # Trigger cache invalidation for visualizations
         st.sidebar.success(f"Loaded database: {os.path.basename(path)}")
     else:
         st.sidebar.error("Database file not found! Removing from history...")
         username = st.session_state.username
-        history = load_json(HISTORY_FILE)
-        if username in history:
-            history[username] = [e for e in history[username] if e["db_path"] != path]
-            save_json(history, HISTORY_FILE)
-            st.session_state.history = history
+        remove_history_entry(username, path)
+        st.session_state.history = load_history()
         st.rerun()
\ No newline at end of file
@@ -1,14 +1,24 @@
 # main.py - Entry point
 import streamlit as st
-from utils import load_json
-from config import USER_FILE, HISTORY_FILE
+from meta_store import load_users, load_history
 from auth import login_page, change_password_page, user_management_page
 from ui import render_sidebar, history_page, main_tabs, activity_log_page
-from database import load_db_from_history
+from database import load_db_from_history, gc_old_dbs
+from utils import split_legacy_log, prune_old_logs
+from config import LOG_RETENTION_DAYS
+
+@st.cache_resource(show_spinner=False)
+def _startup():
+    """Per-process setup that must finish before anything is logged."""
+    split_legacy_log()
+    # Expired databases and log buckets; no session has a database open yet
+    gc_old_dbs()
+    prune_old_logs(LOG_RETENTION_DAYS)
 
 def main():
-    st.session_state.users = load_json(USER_FILE)
-    st.session_state.history = load_json(HISTORY_FILE)
+    _startup()
+    st.session_state.users = load_users()
+    st.session_state.history = load_history()
 
     if not st.session_state.get("authenticated", False):
         login_page()
@@ -0,0 +1,140 @@
+# meta_store.py - Users and database history in a single SQLite file
+import sqlite3
+import threading
+
+import streamlit as st
+
+from config import META_DB, USER_FILE, HISTORY_FILE
+from utils import load_json
+
+_lock = threading.Lock()
+_version = 0  # bumped by every write in this process
+
+@st.cache_resource(show_spinner=False)
+def get_meta_conn():
+    """Shared SQLite connection (WAL mode), created once per process."""
+    con = sqlite3.connect(META_DB, check_same_thread=False, isolation_level=None)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+
+    with _lock:
+        is_new = con.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='users'"
+        ).fetchone() is None
+        con.executescript("""
+            CREATE TABLE IF NOT EXISTS users (
+                username TEXT PRIMARY KEY,
+                pwd_hash TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS history (
+                username TEXT NOT NULL,
+                db_id TEXT NOT NULL,
+                db_path TEXT NOT NULL,
+                num_villages INTEGER,
+                created_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_history_user ON history(username);
+        """)
+        if is_new:
+            _import_json(con)
+    return con
+
+def _import_json(con):
+    """One-time import of the legacy users.json / user_history.json files."""
+    users = load_json(USER_FILE)
+    history = load_json(HISTORY_FILE)
+    con.execute("BEGIN")
+    con.executemany("INSERT OR REPLACE INTO users VALUES (?, ?)", users.items())
+    con.executemany(
+        "INSERT INTO history VALUES (?, ?, ?, ?, ?)",
+        [
+            (user, e["db_id"], e["db_path"], e["num_villages"], e["created_at"])
+            for user, entries in history.items()
+            for e in entries
+        ],
+    )
+    con.execute("COMMIT")
+
+def _bump_version():
+    global _version
+    _version += 1
+
+def _snapshot_key() -> tuple:
+    """Changes whenever users/history change, in this process or another one."""
+    con = get_meta_conn()
+    with _lock:
+        data_version = con.execute("PRAGMA data_version").fetchone()[0]
+    return (_version, data_version)
+
+def load_users() -> dict:
+    """Return {username: password_hash} for all users."""
+    return _load_users(_snapshot_key())
+
+# Only the current snapshot is worth keeping; older ones would pin stale data (password hashes included)
+@st.cache_data(show_spinner=False, max_entries=1)
+def _load_users(snapshot_key: tuple) -> dict:
+    con = get_meta_conn()
+    with _lock:
+        return dict(con.execute("SELECT username, pwd_hash FROM users").fetchall())
+
+def set_user_password(username: str, pwd_hash: str):
+    """Create a user or replace their password hash."""
+    con = get_meta_conn()
+    with _lock:
+        con.execute("INSERT OR REPLACE INTO users VALUES (?, ?)", (username, pwd_hash))
+    _bump_version()
+
+def add_user(username: str, pwd_hash: str) -> bool:
+    """Create a user unless the name is taken. Returns False if it already existed."""
+    con = get_meta_conn()
+    with _lock:
+        cur = con.execute("INSERT OR IGNORE INTO users VALUES (?, ?)", (username, pwd_hash))
+    _bump_version()
+    return cur.rowcount == 1
+
+def delete_users(usernames: list):
+    """Remove users together with their database history in one transaction."""
+    con = get_meta_conn()
+    params = [(user,) for user in usernames]
+    with _lock:
+        con.execute("BEGIN")
+        con.executemany("DELETE FROM users WHERE username = ?", params)
+        con.executemany("DELETE FROM history WHERE username = ?", params)
+        con.execute("COMMIT")
+    _bump_version()
+
+def load_history() -> dict:
+    """Return {username: [history entries]} in creation order."""
+    return _load_history(_snapshot_key())
+
+@st.cache_data(show_spinner=False, max_entries=1)
+def _load_history(snapshot_key: tuple) -> dict:
+    con = get_meta_conn()
+    with _lock:
+        rows = con.execute(
+            "SELECT username, db_id, db_path, num_villages, created_at FROM history ORDER BY rowid"
+        ).fetchall()
+    history = {}
+    for user, db_id, db_path, num_villages, created_at in rows:
+        history.setdefault(user, []).append({
+            "db_id": db_id,
+            "db_path": db_path,
+            "num_villages": num_villages,
+            "created_at": created_at
+        })
+    return history
+
+def add_history_entry(username: str, entry: dict):
+    con = get_meta_conn()
+    with _lock:
+        con.execute(
+            "INSERT INTO history VALUES (?, ?, ?, ?, ?)",
+            (username, entry["db_id"], entry["db_path"], entry["num_villages"], entry["created_at"]),
+        )
+    _bump_version()
+
+def remove_history_entry(username: str, db_path: str):
+    con = get_meta_conn()
+    with _lock:
+        con.execute("DELETE FROM history WHERE username = ? AND db_path = ?", (username, db_path))
+    _bump_version()
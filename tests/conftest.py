@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# Modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Fresh meta store and database directory under tmp_path."""
+    import database
+    import meta_store
+
+    db_dir = tmp_path / "databases"
+    db_dir.mkdir()
+    monkeypatch.setattr(meta_store, "META_DB", str(tmp_path / "meta.db"))
+    monkeypatch.setattr(meta_store, "USER_FILE", str(tmp_path / "users.json"))
+    monkeypatch.setattr(meta_store, "HISTORY_FILE", str(tmp_path / "user_history.json"))
+    monkeypatch.setattr(database, "DB_DIR", str(db_dir))
+    monkeypatch.setattr(database, "LEGACY_DB_DIR", str(tmp_path / "legacy"))
+    meta_store.get_meta_conn.clear()
+    yield db_dir
+    meta_store.get_meta_conn().close()
+    meta_store.get_meta_conn.clear()
@@ -0,0 +1,34 @@
+# Expiry of generated databases and their history rows
+import os
+from datetime import datetime, timedelta
+
+import database
+import meta_store
+
+
+def _add(db_dir, user, name, age_days):
+    created = (datetime.now() - timedelta(days=age_days)).strftime("%Y-%m-%d %H:%M:%S")
+    (db_dir / name).write_bytes(b"db")
+    meta_store.add_history_entry(user, {"db_id": name[:-3], "db_path": name, "num_villages": 28, "created_at": created})
+
+
+def test_gc_removes_only_expired(store):
+    _add(store, "alice", "old.db", 31)
+    _add(store, "alice", "new.db", 29)
+    _add(store, "bob", "bob_old.db", 40)
+
+    database.gc_old_dbs(30)
+
+    assert sorted(os.listdir(store)) == ["new.db"]
+    history = meta_store.load_history()
+    assert [e["db_path"] for e in history["alice"]] == ["new.db"]
+    assert "bob" not in history
+
+
+def test_gc_drops_history_of_missing_files(store):
+    _add(store, "alice", "gone.db", 31)
+    os.remove(store / "gone.db")
+
+    database.gc_old_dbs(30)
+
+    assert meta_store.load_history() == {}
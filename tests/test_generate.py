@@ -0,0 +1,50 @@
+# generate_database's SQL against the reference rules in pop_utils
+import duckdb
+import numpy as np
+import pyarrow as pa
+import pytest
+import streamlit as st
+
+import database
+from pop_utils import get_marriage_to_village_id
+
+ROWS = 400  # COUNTER wraps at 196, so this covers more than two cycles
+
+
+@pytest.fixture
+def generated(store, monkeypatch):
+    """Generate a small database from a synthetic base table; returns its rows."""
+    counter = np.arange(1, ROWS + 1, dtype=np.int64)
+    base = pa.table({
+        "COUNTER": counter,
+        "FAMILY_ID": counter,
+        "PERSON_ID": counter,
+        "BIRTH_DATE_SERIAL": np.full(ROWS, 45000, dtype=np.int64),
+        "Date_of_Birth": ["x"] * ROWS,
+        "idx": counter - 1,
+    })
+    monkeypatch.setattr(database, "load_base_data", lambda: base)
+    monkeypatch.setattr(database, "log_user_action", lambda *args: None)
+    st.session_state.update(username="tester", db_version=0)
+
+    database.generate_database(60)  # two full 28-village groups and a partial one
+
+    con = duckdb.connect(st.session_state.db_path, read_only=True)
+    try:
+        return con.execute(
+            "SELECT VILLAGE_ID, COUNTER, MARRIED_TO_VILLAGE_ID FROM population"
+        ).fetchall()
+    finally:
+        con.close()
+
+
+def test_marriage_matches_reference(generated):
+    assert len(generated) == 60 * ROWS
+    for vid, counter, married_to in generated:
+        assert married_to == get_marriage_to_village_id(vid, counter)
+
+
+def test_marriage_stays_in_group_and_leaves_village(generated):
+    for vid, _, married_to in generated:
+        assert married_to != vid
+        assert (married_to - 1) // 28 == (vid - 1) // 28
@@ -0,0 +1,92 @@
+# Legacy log import and retention of the day buckets
+import json
+import os
+from datetime import date, timedelta
+
+import pytest
+
+import config
+import utils
+
+
+@pytest.fixture
+def log_dir(tmp_path, monkeypatch):
+    log_dir = tmp_path / "logs"
+    monkeypatch.setattr(config, "LOG_FILE", str(tmp_path / "logs.json"))
+    monkeypatch.setattr(config, "LOG_DIR", str(log_dir))
+    writer = utils._LogWriter(str(log_dir))
+    monkeypatch.setattr(utils, "_log_writer", writer)
+    yield log_dir
+    writer.flush_and_close()
+
+
+def _entry(day, i):
+    return {"timestamp": f"{day} 10:00:{i:02d}", "user": "u", "action": "A", "details": f"{day}/{i}"}
+
+
+def _read(path):
+    return [json.loads(line) for line in open(path, "rb") if line.strip()]
+
+
+def test_split_legacy_log_by_day(log_dir):
+    days = ["2024-05-20", "2024-05-21", "2024-05-22"]
+    entries = [_entry(day, i) for day in days for i in range(3)]
+    # Old layouts: spaced separators, a day interleaved at midnight, junk lines
+    lines = [json.dumps(e) for e in entries[:4]] + ["not json", json.dumps({"user": "x"})]
+    lines += [json.dumps(entries[2]).replace("/2", "/late"), ""] + [json.dumps(e) for e in entries[4:]]
+    with open(config.LOG_FILE, "w") as f:
+        f.write("\n".join(lines))  # no newline after the last line
+
+    utils.split_legacy_log()
+
+    assert sorted(os.listdir(log_dir)) == sorted(
+        [utils.LEGACY_LOG_MARKER] + [day + suffix for day in days for suffix in (".ndjson", ".ndjson.idx")]
+    )
+    late = dict(entries[2], details="2024-05-20/late")
+    assert _read(log_dir / "2024-05-20.ndjson") == entries[:3] + [late]
+    assert _read(log_dir / "2024-05-21.ndjson") == entries[3:6]
+    assert _read(log_dir / "2024-05-22.ndjson") == entries[6:]
+    header, *records = utils._IDX_RECORD.iter_unpack((log_dir / "2024-05-22.ndjson.idx").read_bytes())
+    assert len(records) == 3
+
+
+def test_split_legacy_log_runs_once(log_dir):
+    with open(config.LOG_FILE, "w") as f:
+        f.write(json.dumps(_entry("2024-05-20", 0)) + "\n")
+    utils.split_legacy_log()
+    bucket = log_dir / "2024-05-20.ndjson"
+    bucket.write_text(json.dumps(_entry("2024-05-20", 1)) + "\n")
+
+    # The marker makes a second run a no-op, even with new lines in the legacy file
+    with open(config.LOG_FILE, "a") as f:
+        f.write(json.dumps(_entry("2024-05-23", 0)) + "\n")
+    utils.split_legacy_log()
+
+    assert _read(bucket) == [_entry("2024-05-20", 1)]
+    assert not (log_dir / "2024-05-23.ndjson").exists()
+
+
+def test_split_legacy_log_without_legacy_file(log_dir):
+    utils.split_legacy_log()
+    assert os.listdir(log_dir) == [utils.LEGACY_LOG_MARKER]
+
+
+def test_prune_old_logs_keeps_recent_buckets(log_dir):
+    log_dir.mkdir()
+    today = date.today()
+    ages = [0, 1, 89, 90, 91, 400]
+    for age in ages:
+        path = utils._bucket_path(str(log_dir), (today - timedelta(days=age)).isoformat())
+        with open(path, "w") as f:
+            f.write("{}\n")
+        with open(path + utils.LOG_INDEX_SUFFIX, "wb"):
+            pass
+
+    utils.prune_old_logs(90)
+
+    kept = sorted(os.listdir(log_dir))
+    assert kept == sorted(
+        (today - timedelta(days=age)).isoformat() + suffix
+        for age in ages if age <= 90
+        for suffix in (".ndjson", ".ndjson.idx")
+    )
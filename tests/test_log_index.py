@@ -0,0 +1,182 @@
+# Round trips for the day-bucket log and its sidecar index
+import json
+import os
+import time
+
+import pytest
+
+import utils
+
+DAY = "2024-05-21"
+
+
+def _write(log_dir, entries):
+    """Append entries through the real writer and return the bucket path."""
+    writer = utils._LogWriter(str(log_dir))
+    for ts, user, action, details in entries:
+        writer.put(utils._format_log_line(ts, user, action, details), ts)
+    writer.flush_and_close()
+    return utils._bucket_path(str(log_dir), DAY)
+
+
+def _entries(n, start=0):
+    return [(f"{DAY} 10:{i // 60:02d}:{i % 60:02d}", "u", "A", f"d{i}") for i in range(start, start + n)]
+
+
+def _live(path):
+    return [json.loads(line) for line in open(path, "rb") if line.strip()]
+
+
+def _index(path):
+    with open(path + utils.LOG_INDEX_SUFFIX, "rb") as f:
+        return list(utils._IDX_RECORD.iter_unpack(f.read()))
+
+
+def _keys(entries):
+    return {utils._entry_key(dict(zip(("timestamp", "user", "action", "details"), e))) for e in entries}
+
+
+def test_writer_indexes_every_line(tmp_path):
+    entries = _entries(20)
+    path = _write(tmp_path, entries)
+
+    header, *records = _index(path)
+    assert header == (utils._IDX_MAGIC, 0, 0)
+    assert len(records) == 20
+    with open(path, "rb") as f:
+        data = f.read()
+    for (ts_key, offset, length), (ts, *_rest) in zip(records, entries):
+        assert ts_key == utils._ts_key(ts)
+        assert json.loads(data[offset:offset + length])["timestamp"] == ts
+
+
+def test_index_delete_blanks_lines_in_place(tmp_path):
+    entries = _entries(20)
+    path = _write(tmp_path, entries)
+    size = os.path.getsize(path)
+
+    assert utils._index_delete(path, _keys(entries[3:5])) == (2, 20)
+
+    assert os.path.getsize(path) == size
+    assert _live(path) == [json.loads(utils._format_log_line(*e)) for e in entries[:3] + entries[5:]]
+    header, *records = _index(path)
+    assert header[1] == 2
+    assert [bool(r[2] & utils._TOMBSTONE) for r in records] == [3 <= i < 5 for i in range(20)]
+    # Already deleted lines are no longer found
+    assert utils._index_delete(path, _keys(entries[3:4])) is None
+
+
+def test_missing_index_falls_back_and_rebuilds(tmp_path):
+    entries = _entries(20)
+    path = _write(tmp_path, entries)
+    os.remove(path + utils.LOG_INDEX_SUFFIX)
+
+    utils._delete_from_log(path, _keys(entries[:2]))
+
+    assert [e["details"] for e in _live(path)] == [f"d{i}" for i in range(2, 20)]
+    header, *records = _index(path)
+    assert len(records) == 18
+    assert utils._index_delete(path, _keys(entries[10:11])) == (1, 18)
+
+
+def test_rebuild_counts_existing_tombstones(tmp_path):
+    entries = _entries(20)
+    path = _write(tmp_path, entries)
+    utils._index_delete(path, _keys(entries[5:9]))
+
+    utils._rebuild_log_index(path)
+
+    header, *records = _index(path)
+    assert header == (utils._IDX_MAGIC, 4, 0)
+    assert len(records) == 20
+    assert [r[0] for r in records] == sorted(r[0] for r in records)
+    assert utils._index_delete(path, _keys(entries[12:13])) == (5, 20)
+
+
+def test_compaction_drops_tombstones(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "LOG_COMPACT_MIN", 4)
+    entries = _entries(16)
+    path = _write(tmp_path, entries)
+
+    utils._delete_from_log(path, _keys(entries[:3]))
+    assert _index(path)[0][1] == 3  # below LOG_COMPACT_MIN: lines stay blanked
+    utils._delete_from_log(path, _keys(entries[3:4]))
+
+    with open(path, "rb") as f:
+        assert all(line.strip() for line in f)
+    header, *records = _index(path)
+    assert header[1] == 0
+    assert len(records) == 12
+
+
+def test_lines_in_another_layout_use_the_streaming_pass(tmp_path):
+    path = utils._bucket_path(str(tmp_path), DAY)
+    legacy = [dict(zip(("timestamp", "user", "action", "details"), e)) for e in _entries(10)]
+    with open(path, "w") as f:
+        f.writelines(json.dumps(e) + "\n" for e in legacy)
+    utils._rebuild_log_index(path)
+
+    # The index finds the timestamps, but the bytes differ from the compact format
+    assert utils._index_delete(path, {utils._entry_key(legacy[4])}) is None
+    utils._delete_from_log(path, {utils._entry_key(legacy[4])})
+
+    assert _live(path) == legacy[:4] + legacy[5:]
+
+
+@pytest.mark.parametrize("details", [{"b": [1, 2], "a": "x"}, 0, ""])
+def test_structured_details_round_trip(tmp_path, details):
+    path = _write(tmp_path, [(f"{DAY} 10:00:00", "u", "A", details), (f"{DAY} 10:00:01", "u", "A", "keep")])
+    logged = _live(path)[0]
+    assert logged["details"] == details
+
+    assert utils._index_delete(path, {utils._entry_key(logged)}) == (1, 2)
+    assert [e["details"] for e in _live(path)] == ["keep"]
+
+
+def test_clock_step_back_disables_binary_search(tmp_path):
+    later, earlier = _entries(5, start=10), _entries(5)
+    path = _write(tmp_path, later + earlier)
+
+    assert _index(path)[0] == (utils._IDX_MAGIC, 0, utils._IDX_UNORDERED)
+    assert utils._index_delete(path, _keys(later[2:3] + earlier[1:2])) == (2, 10)
+    assert [e["details"] for e in _live(path)] == ["d10", "d11", "d13", "d14", "d0", "d2", "d3", "d4"]
+
+    utils._rebuild_log_index(path)
+    assert _index(path)[0] == (utils._IDX_MAGIC, 2, utils._IDX_UNORDERED)
+
+
+def test_line_killed_by_first_byte_only_is_a_tombstone(tmp_path):
+    # State after a crash between the two writes of _index_delete
+    entries = _entries(5)
+    path = _write(tmp_path, entries)
+    header, *records = _index(path)
+    offset = records[2][1]
+    with open(path, "r+b") as f:
+        os.pwrite(f.fileno(), b" ", offset)
+
+    assert [e["details"] for e in utils.tail_jsonl(path, 10)] == ["d4", "d3", "d1", "d0"]
+    utils._rebuild_log_index(path)
+    assert _index(path)[0][1] == 1
+
+
+def test_failed_write_is_reported_and_retried(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(utils, "LOG_RETRY_DELAY", 0.05)
+    log_dir = tmp_path / "logs"
+    log_dir.write_bytes(b"")  # not a directory, so every write fails
+    writer = utils._LogWriter(str(log_dir))
+    entries = _entries(3)
+    for ts, user, action, details in entries:
+        writer.put(utils._format_log_line(ts, user, action, details), ts)
+    writer.flush()  # returns even though nothing could be written
+    assert "Activity log write failed" in caplog.text
+
+    log_dir.unlink()
+    log_dir.mkdir()
+    path = utils._bucket_path(str(log_dir), DAY)
+    deadline = time.monotonic() + 5
+    while not (os.path.exists(path) and len(_live(path)) == 3) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    writer.flush_and_close()
+
+    assert [e["details"] for e in _live(path)] == ["d0", "d1", "d2"]
+    assert len(_index(path)) == 4
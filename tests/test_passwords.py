@@ -0,0 +1,41 @@
+# Argon2id hashing and the lazy migration of legacy SHA-256 digests
+from hashlib import sha256
+
+import utils
+
+
+def test_argon2_hash_round_trips():
+    stored = utils.hash_password("s3cret-pass")
+    assert stored.startswith("$argon2id$")
+    assert utils.verify_password(stored, "s3cret-pass")
+    assert not utils.password_needs_rehash(stored)
+
+
+def test_hashes_are_salted():
+    assert utils.hash_password("s3cret-pass") != utils.hash_password("s3cret-pass")
+
+
+def test_wrong_password_is_rejected():
+    stored = utils.hash_password("s3cret-pass")
+    assert not utils.verify_password(stored, "s3cret-pasS")
+    assert not utils.verify_password(stored, "")
+
+
+def test_legacy_sha256_digest_verifies_and_needs_rehash():
+    legacy = sha256("old-pass1".encode("utf-8")).hexdigest()
+    assert utils.verify_password(legacy, "old-pass1")
+    assert not utils.verify_password(legacy, "old-pass2")
+    assert utils.password_needs_rehash(legacy)
+
+
+def test_malformed_hash_returns_false():
+    for stored in ("$argon2id$garbage", "$argon2id$v=19$m=1,t=1,p=1$AAAA$BBBB", "", "not-a-hash"):
+        assert utils.verify_password(stored, "anything") is False
+
+
+def test_outdated_argon2_parameters_need_rehash():
+    from argon2 import PasswordHasher
+
+    weak = PasswordHasher(time_cost=1, memory_cost=8 * 1024, parallelism=1).hash("s3cret-pass")
+    assert utils.verify_password(weak, "s3cret-pass")
+    assert utils.password_needs_rehash(weak)
@@ -0,0 +1,60 @@
+# Reading the newest entries from the end of an NDJSON file
+import json
+
+import pytest
+
+import utils
+
+
+def _line(i):
+    return json.dumps({"timestamp": f"2024-05-21 10:00:{i:02d}", "user": "u", "action": "A", "details": f"d{i}"}) + "\n"
+
+
+def _details(entries):
+    return [e["details"] for e in entries]
+
+
+@pytest.fixture(params=[7, 64 * 1024], ids=["small-blocks", "default-blocks"])
+def block_size(request, monkeypatch):
+    # 7 bytes puts every line across several block boundaries
+    monkeypatch.setattr(utils, "TAIL_BLOCK_SIZE", request.param)
+    return request.param
+
+
+def test_newest_first_and_limited(tmp_path, block_size):
+    path = tmp_path / "log.ndjson"
+    path.write_text("".join(_line(i) for i in range(10)))
+
+    assert _details(utils.tail_jsonl(str(path), 3)) == ["d9", "d8", "d7"]
+    assert _details(utils.tail_jsonl(str(path), 100)) == [f"d{i}" for i in reversed(range(10))]
+
+
+def test_skips_blank_tombstoned_and_invalid_lines(tmp_path, block_size):
+    path = tmp_path / "log.ndjson"
+    tombstone = " " * (len(_line(2)) - 1) + "\n"
+    half_killed = " " + _line(3)[1:]
+    path.write_text(_line(0) + "\n" + _line(1) + tombstone + half_killed + "not json\n" + _line(4))
+
+    assert _details(utils.tail_jsonl(str(path), 10)) == ["d4", "d1", "d0"]
+
+
+def test_last_line_without_newline(tmp_path, block_size):
+    path = tmp_path / "log.ndjson"
+    path.write_text(_line(0) + _line(1).rstrip("\n"))
+    assert _details(utils.tail_jsonl(str(path), 10)) == ["d1", "d0"]
+
+    # A write cut short by a crash
+    path.write_text(_line(0) + _line(1)[:20])
+    assert _details(utils.tail_jsonl(str(path), 10)) == ["d0"]
+
+
+def test_keep_filters_before_counting(tmp_path, block_size):
+    path = tmp_path / "log.ndjson"
+    path.write_text("".join(_line(i) for i in range(10)))
+
+    entries = utils.tail_jsonl(str(path), 2, keep=lambda e: int(e["details"][1:]) % 3 == 0)
+    assert _details(entries) == ["d9", "d6"]
+
+
+def test_missing_file(tmp_path):
+    assert utils.tail_jsonl(str(tmp_path / "nope.ndjson"), 5) == []
@@ -1,14 +1,16 @@
 import streamlit as st
-import duckdb
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import os
 import json
+from operator import itemgetter
+from pathlib import Path
 
-from database import generate_database, load_base_data
-from config import MIN_VILLAGES, MAX_VILLAGES, HISTORY_FILE, LOG_FILE
-from utils import load_json, log_user_action
+from database import generate_database, load_base_data, get_conn, resolve_db_path
+from config import MIN_VILLAGES, MAX_VILLAGES, LOG_PAGE_SIZE, DAY_NAMES
+from utils import log_user_action, flush_logs, tail_logs
+from meta_store import load_history
 
 def render_sidebar():
     """Render the main sidebar with navigation buttons."""
@@ -48,32 +50,26 @@ def activity_log_page():
     """Display activity logs with delete option."""
     st.title("Activity Logs")
     
-    # Load logs
-    logs = []
-    if os.path.exists(LOG_FILE):
-        with open(LOG_FILE, "r") as f:
-            for line in f:
-                if line.strip():
-                    try:
-                        logs.append(json.loads(line))
-                    except json.JSONDecodeError:
-                        continue
+    # Load only the newest window of logs; non-admin users only see their own entries
+    flush_logs()
+    is_admin = st.session_state.username == "admin"
+    window = st.session_state.setdefault("log_window", LOG_PAGE_SIZE)
+    keep = None if is_admin else (lambda entry: entry.get("user") == st.session_state.username)
+    logs = tail_logs(window + 1, keep)
+    has_more = len(logs) > window
+    logs = logs[:window]
     
     if not logs:
-        st.info("No activity recorded yet.")
+        st.info("No activity recorded yet." if is_admin else "No activity found for your account.")
     else:
-        # Filter for non-admin users
-        if st.session_state.username != "admin":
-            logs = [entry for entry in logs if entry["user"] == st.session_state.username]
-            if not logs:
-                st.info("No activity found for your account.")
-                st.stop() # Use stop to prevent empty dataframe error if needed
-
-        # Prepare for Editor
-        # Add a unique key or just rely on row props? Better to just wrap in Pandas
+        # Sort by timestamp descending ("YYYY-MM-DD HH:MM:SS" sorts chronologically as a string).
+        # tail_logs already returns newest first, so this is nearly free.
+        logs.sort(key=itemgetter("timestamp"), reverse=True)
+        
+        # Prepare for Editor (pandas only for display); structured details are shown as JSON text
         df_logs = pd.DataFrame(logs)
-        # Sort by timestamp descending
-        df_logs = df_logs.sort_values(by="timestamp", ascending=False)
+        if "details" in df_logs:
+            df_logs["details"] = df_logs["details"].map(lambda d: d if isinstance(d, str) else json.dumps(d))
         
         # Insert 'Select' column for checkbox
         df_logs.insert(0, "Select", False)
@@ -99,18 +95,25 @@ def activity_log_page():
         
         if not selected_rows.empty:
             if st.button(f"Delete ({len(selected_rows)}) Entries", type="primary"):
-                # Convert back to dict list for utility
-                # Drop 'Select' column
-                to_delete = selected_rows.drop(columns=["Select"]).to_dict("records")
+                # Pass the original entries (the editor index is their position in logs),
+                # so details keep their logged type
+                to_delete = [logs[i] for i in selected_rows.index]
                 
                 from utils import delete_log_entries
                 delete_log_entries(to_delete)
                 
                 st.success(f"Deleted {len(to_delete)} entries.")
+                # The refilled window keeps the same shape, so stale ticks would carry over to other rows
+                st.session_state.pop("log_editor", None)
                 st.rerun()
 
+        if has_more and st.button("Load more"):
+            st.session_state.log_window += LOG_PAGE_SIZE
+            st.rerun()
+
     if st.button("Back to Dashboard"):
         st.session_state.show_activity_log = False
+        st.session_state.pop("log_window", None)
         st.rerun()
 
 def history_page():
@@ -125,15 +128,16 @@ def history_page():
         for entry in sorted(user_hist, key=lambda x: x["created_at"], reverse=True):
             with st.expander(f"{entry['db_id']} • {entry['num_villages']} villages • {entry['created_at']}"):
                 st.write(f"**File:** `{entry['db_path']}`")
-                if os.path.exists(entry["db_path"]):
-                    with open(entry["db_path"], "rb") as f:
-                        st.download_button(
-                            label="Download Database",
-                            data=f.read(),
-                            file_name=os.path.basename(entry["db_path"]),
-                            mime="application/octet-stream",
-                            key=f"hist_dl_{entry['db_id']}"
-                        )
+                db_path = resolve_db_path(entry["db_path"])
+                if os.path.exists(db_path):
+                    # Callable data: the file is only read when the button is clicked
+                    st.download_button(
+                        label="Download Database",
+                        data=Path(db_path).read_bytes,
+                        file_name=os.path.basename(entry["db_path"]),
+                        mime="application/octet-stream",
+                        key=f"hist_dl_{entry['db_id']}"
+                    )
                 else:
                     st.warning("File not found (may have been deleted externally)")
 
@@ -141,6 +145,36 @@ def history_page():
         st.session_state.show_history = False
         st.rerun()
 
+@st.cache_data(show_spinner=False)
+def _total_records(db_path: str, db_version: int) -> int:
+    """Row count shown in the SQL Explorer, cached until db_version changes."""
+    con = get_conn(db_path).cursor()
+    total_row = con.execute("SELECT COUNT(*) FROM population").fetchone()
+    con.close()
+    return total_row[0] if total_row else 0
+
+@st.cache_data(show_spinner=False)
+def _viz_aggregates(db_path: str, db_version: int) -> pd.DataFrame:
+    """Aggregate counts for the Visualizations tab, cached until db_version changes."""
+    con = get_conn(db_path).cursor()
+    # Single scan for all charts, already in plotting shape:
+    # one row per village with MALE/FEMALE columns, then one row per weekday in Monday..Sunday order.
+    df_agg = con.execute("""
+        SELECT 
+            GROUPING(VILLAGE_ID) as by_day,
+            VILLAGE_ID, 
+            DAY_OF_WEEK, 
+            COUNT(*) FILTER (WHERE GENDER = 'MALE') as MALE,
+            COUNT(*) FILTER (WHERE GENDER = 'FEMALE') as FEMALE,
+            COUNT(*) as Count 
+        FROM population 
+        GROUP BY GROUPING SETS ((VILLAGE_ID), (DAY_OF_WEEK))
+        ORDER BY by_day, VILLAGE_ID, DAY_OF_WEEK
+    """).fetchdf()
+    df_agg["Day"] = df_agg["DAY_OF_WEEK"].map(dict(enumerate(DAY_NAMES)))
+    con.close()
+    return df_agg
+
 def main_tabs():
     """Main content with three tabs: Generate DB/Select DB, SQL Explorer, Visualizations."""
     df_base = load_base_data()
@@ -183,10 +217,7 @@ def main_tabs():
             st.info("Select a database generated by the Administrator.")
             
             # Load admin's history
-            from config import HISTORY_FILE
-            from utils import load_json
-            
-            history = load_json(HISTORY_FILE)
+            history = load_history()
             admin_dbs = history.get("admin", [])
             
             if not admin_dbs:
@@ -203,7 +234,7 @@ def main_tabs():
                 
                 if st.button("Load Database", type="primary"):
                     selected_db = db_options[selected_label]
-                    db_path = selected_db["db_path"]
+                    db_path = resolve_db_path(selected_db["db_path"])
                     
                     if os.path.exists(db_path):
                         st.session_state.update(
@@ -225,23 +256,9 @@ def main_tabs():
         if not st.session_state.get("db_generated", False):
             st.info("Please generate or load a database first.")
         else:
-            # Optional schema upgrade for older databases
-            try:
-                con = duckdb.connect(st.session_state.db_path)
-                cols = [row[1] for row in con.execute("PRAGMA table_info(population)").fetchall()]
-                if "MARRIED_TO_VILLAGE_ID" not in cols:
-                    con.execute("ALTER TABLE population ADD COLUMN MARRIED_TO_VILLAGE_ID INTEGER")
-                    st.info("Added missing column: MARRIED_TO_VILLAGE_ID")
-                con.close()
-            except Exception as e:
-                st.warning("Could not check/upgrade schema (continuing anyway)")
-
-            # Get total record count safely
+            # Get total record count safely (older databases are upgraded when first opened)
             try:
-                con = duckdb.connect(st.session_state.db_path, read_only=True)
-                total_row = con.execute("SELECT COUNT(*) FROM population").fetchone()
-                total = total_row[0] if total_row else 0
-                con.close()
+                total = _total_records(st.session_state.db_path, st.session_state.db_version)
             except Exception as e:
                 st.error("Error reading database")
                 st.code(str(e))
@@ -267,7 +284,7 @@ def main_tabs():
 
             if st.button("Run Query", type="primary") and sql.strip():
                 try:
-                    con = duckdb.connect(st.session_state.db_path, read_only=True)
+                    con = get_conn(st.session_state.db_path).cursor()
                     result_df = con.execute(sql).fetchdf()
                     con.close()
                     
@@ -292,55 +309,37 @@ def main_tabs():
         if not st.session_state.get("db_generated", False):
             st.warning("Generate or load a database first.")
         else:
-            con = duckdb.connect(st.session_state.db_path, read_only=True)
+            try:
+                df_agg = _viz_aggregates(st.session_state.db_path, st.session_state.db_version)
+            except Exception as e:
+                # e.g. an older DB that could not be upgraded (read-only file, locked)
+                st.error("Error reading database")
+                st.code(str(e))
+                st.stop()
+            
+            df_vil = df_agg[df_agg["by_day"] == 0]
+            df_day = df_agg[df_agg["by_day"] == 1]
+            df_gen = pd.DataFrame({"GENDER": ["MALE", "FEMALE"], "Count": [df_vil["MALE"].sum(), df_vil["FEMALE"].sum()]})
             
             col1, col2 = st.columns(2)
 
             with col1:
                 st.subheader("Population per Village")
-                df_vol = con.execute("SELECT VILLAGE_ID, COUNT(*) as Population FROM population GROUP BY VILLAGE_ID ORDER BY VILLAGE_ID").fetchdf()
-                fig1 = px.bar(df_vol, x="VILLAGE_ID", y="Population")
+                fig1 = px.bar(df_vil, x="VILLAGE_ID", y="Count", labels={"Count": "Population"})
                 st.plotly_chart(fig1, use_container_width=True)
 
                 st.subheader("Overall Gender Ratio")
-                df_gen = con.execute("SELECT GENDER, COUNT(*) as Count FROM population GROUP BY GENDER").fetchdf()
                 fig2 = px.pie(df_gen, names="GENDER", values="Count", hole=0.4, color_discrete_sequence=["lightblue", "pink"])
                 st.plotly_chart(fig2, use_container_width=True)
 
             with col2:
                 st.subheader("Gender Distribution per Village")
-                # SQL Based Pivot-ish query
-                df_gen_vil = con.execute("""
-                    SELECT VILLAGE_ID, GENDER, COUNT(*) as Count 
-                    FROM population 
-                    GROUP BY VILLAGE_ID, GENDER 
-                    ORDER BY VILLAGE_ID
-                """).fetchdf()
-                
-                # Transform for plotting (simple pivot in pandas is fast for 560 rows)
-                gv = df_gen_vil.pivot(index="VILLAGE_ID", columns="GENDER", values="Count").fillna(0)
-                
                 fig3 = go.Figure()
-                fig3.add_trace(go.Bar(name="Male", x=gv.index, y=gv.get("MALE", []), marker_color="lightblue"))
-                fig3.add_trace(go.Bar(name="Female", x=gv.index, y=gv.get("FEMALE", []), marker_color="pink"))
+                fig3.add_trace(go.Bar(name="Male", x=df_vil["VILLAGE_ID"], y=df_vil["MALE"], marker_color="lightblue"))
+                fig3.add_trace(go.Bar(name="Female", x=df_vil["VILLAGE_ID"], y=df_vil["FEMALE"], marker_color="pink"))
                 fig3.update_layout(barmode="stack", title="Males & Females per Village")
                 st.plotly_chart(fig3, use_container_width=True)
 
                 st.subheader("Births by Day of Week")
-                # Using string split to get Day (Format: "Monday, January 1, 2000")
-                # str_split returns a list, indexes are 1-based in DuckDB
-                df_day = con.execute("""
-                    SELECT str_split(Date_of_Birth, ', ')[1] as Day, COUNT(*) as Count 
-                    FROM population 
-                    GROUP BY 1
-                """).fetchdf()
-                
-                order = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-                # Use pandas categorical sort for small dataset (7 rows)
-                df_day["Day"] = pd.Categorical(df_day["Day"], categories=order, ordered=True)
-                df_day = df_day.sort_values("Day")
-                
                 fig4 = px.bar(df_day, x="Day", y="Count")
                 st.plotly_chart(fig4, use_container_width=True)
-            
-            con.close()
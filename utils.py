@@ -1,66 +1,667 @@
 # utils.py
+import atexit
+import itertools
 import json
-import hashlib
+import hmac
+import logging
+import mmap
 import os
+import queue
+import re
+import struct
+import threading
+import time
+from datetime import date, timedelta
+from hashlib import sha256 as _sha256
+from json.encoder import encode_basestring_ascii as _json_str
+
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib decoder
+    orjson = None
+
+def _json_loads(data: bytes):
+    return orjson.loads(data) if orjson else json.loads(data)
+
+# Argon2id parameters per OWASP recommendation
+_ph = PasswordHasher(time_cost=2, memory_cost=46 * 1024, parallelism=1)
+
+def _legacy_hash(pwd: str) -> str:
+    """Unsalted SHA-256 digest used by accounts created before Argon2id."""
+    return _sha256(pwd.encode("utf-8", "surrogatepass")).hexdigest()
 
 def hash_password(pwd: str) -> str:
-    return hashlib.sha256(pwd.encode()).hexdigest()
+    return _ph.hash(pwd)
+
+def verify_password(stored_hash: str, pwd: str) -> bool:
+    """Check a password against a stored Argon2id (or legacy SHA-256) hash."""
+    if not stored_hash.startswith("$argon2"):
+        return hmac.compare_digest(stored_hash, _legacy_hash(pwd))
+    try:
+        return _ph.verify(stored_hash, pwd)
+    except (VerificationError, InvalidHashError):  # mismatch, or a corrupt hash
+        return False
+
+def password_needs_rehash(stored_hash: str) -> bool:
+    """True for legacy digests and Argon2 hashes with outdated parameters."""
+    if not stored_hash.startswith("$argon2"):
+        return True
+    return _ph.check_needs_rehash(stored_hash)
 
 def load_json(file_path: str, default=None):
-    if default is None:
-        default = {}
-    if os.path.exists(file_path):
-        with open(file_path, "r") as f:
-            return json.load(f)
-    return default
+    try:
+        with open(file_path, "rb") as f:
+            return _json_loads(f.read())
+    except FileNotFoundError:
+        return {} if default is None else default
 
-def save_json(data, file_path: str):
-    with open(file_path, "w") as f:
-        json.dump(data, f, indent=2)
+_logger = logging.getLogger(__name__)
 
-def log_user_action(username: str, action: str, details=None):
-    from datetime import datetime
-    from config import LOG_FILE
+# Log writes happen on a background thread; log_user_action only enqueues
+LOG_BATCH_SIZE = 50
+# After a failed write the lines are kept (up to LOG_RETRY_MAX) and retried every LOG_RETRY_DELAY seconds
+LOG_RETRY_DELAY = 5.0
+LOG_RETRY_MAX = 10_000
+LOG_BUCKET_SUFFIX = ".ndjson"
+
+# Sidecar index next to the log: one fixed-width record per line, in append order.
+# Record 0 is a header holding the number of tombstoned (blanked) lines and flags.
+LOG_INDEX_SUFFIX = ".idx"
+_IDX_RECORD = struct.Struct("<qQH6x")  # timestamp key, byte offset, line length (+ padding to 24 bytes)
+_IDX_MAGIC = -1
+_IDX_UNORDERED = 1  # header flag: keys went backwards (clock step, DST), so no binary search
+_TOMBSTONE = 0x8000  # high bit of the length field
+
+def _ts_key(timestamp) -> int:
+    """Sortable integer for a "YYYY-MM-DD HH:MM:SS" timestamp, or None if it isn't one."""
+    if not isinstance(timestamp, str) or len(timestamp) != 19:
+        return None
+    digits = timestamp[0:4] + timestamp[5:7] + timestamp[8:10] + timestamp[11:13] + timestamp[14:16] + timestamp[17:19]
+    return int(digits) if digits.isdigit() else None
+
+def _bucket_path(log_dir: str, day: str) -> str:
+    """Log file for one "YYYY-MM-DD" day."""
+    return os.path.join(log_dir, day + LOG_BUCKET_SUFFIX)
+
+def _log_buckets(log_dir: str) -> list:
+    """Paths of all day buckets, oldest first."""
+    try:
+        names = os.listdir(log_dir)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(log_dir, name) for name in sorted(names) if name.endswith(LOG_BUCKET_SUFFIX)]
+
+class _LogWriter:
+    """Group-commit appender: each drained batch is one write() + fsync() per day bucket on a long-lived fd."""
+
+    def __init__(self, log_dir: str, batch_size: int = LOG_BATCH_SIZE):
+        self.log_dir = log_dir
+        self.batch_size = batch_size
+        # Held while appending; delete_log_entries holds it while swapping files
+        self.lock = threading.Lock()
+        self._q = queue.Queue()
+        self._path = None
+        self._fd = None
+        self._idx_fd = None
+        self._idx_end = 0
+        self._idx_flags = 0
+        self._last_key = 0
+        threading.Thread(target=self._run, name="log-writer", daemon=True).start()
+
+    def put(self, line: bytes, timestamp: str):
+        self._q.put_nowait((_bucket_path(self.log_dir, timestamp[:10]), line, _ts_key(timestamp)))
+
+    def flush(self):
+        """Block until every queued line has been written (or kept for retry after a write error)."""
+        self._q.join()
+
+    def reopen(self):
+        """Drop the fds so the next batch opens the current files. Call with self.lock held."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        if self._idx_fd is not None:
+            os.close(self._idx_fd)
+            self._idx_fd = None
+        self._path = None
+
+    def flush_and_close(self):
+        self.flush()
+        with self.lock:
+            self.reopen()
+
+    def _run(self):
+        pending = []  # lines from failed writes, retried ahead of newer ones
+        while True:
+            batch = []
+            try:
+                batch.append(self._q.get(timeout=LOG_RETRY_DELAY if pending else None))
+            except queue.Empty:
+                pass
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            items = pending + batch
+            done = 0
+            try:
+                with self.lock:
+                    try:
+                        # A batch only spans two buckets around midnight
+                        for path, group in itertools.groupby(items, key=lambda item: item[0]):
+                            group = list(group)
+                            self._append(path, group)
+                            done += len(group)
+                    except OSError:
+                        # The writer thread must survive, and the lines must not be lost
+                        if not pending:
+                            _logger.exception("Activity log write failed; retrying every %ss", LOG_RETRY_DELAY)
+                        self.reopen()
+                if pending and done == len(items):
+                    _logger.warning("Activity log writes recovered; %d delayed entries written", len(pending))
+                pending = items[done:]
+                if len(pending) > LOG_RETRY_MAX:
+                    _logger.error("Activity log retry buffer full; dropping %d entries", len(pending) - LOG_RETRY_MAX)
+                    pending = pending[-LOG_RETRY_MAX:]
+            finally:
+                for _ in batch:
+                    self._q.task_done()
+
+    def _append(self, path: str, items: list):
+        if self._path != path:
+            self.reopen()
+            os.makedirs(self.log_dir, exist_ok=True)
+            flags = os.O_CREAT | os.O_CLOEXEC
+            self._fd = os.open(path, flags | os.O_WRONLY | os.O_APPEND, 0o644)
+            # Not O_APPEND: the header is rewritten in place when the flags change
+            self._idx_fd = os.open(path + LOG_INDEX_SUFFIX, flags | os.O_RDWR, 0o644)
+            self._path = path
+            self._idx_end, self._idx_flags, self._last_key = _read_index_tail(path + LOG_INDEX_SUFFIX)
+            if self._idx_end == 0:
+                os.ftruncate(self._idx_fd, 0)
+                self._idx_end = os.pwrite(self._idx_fd, _IDX_RECORD.pack(_IDX_MAGIC, 0, 0), 0)
+        offset = os.fstat(self._fd).st_size
+        # Append-only (NDJSON format)
+        data = memoryview(b"".join(line for _, line, _ in items))
+        try:
+            while data:
+                data = data[os.write(self._fd, data):]
+            os.fsync(self._fd)
+        except OSError:
+            # Drop a partial write so the retry doesn't glue a torn line onto the next one
+            try:
+                os.ftruncate(self._fd, offset)
+            except OSError:
+                pass
+            raise
+        try:
+            self._append_index(items, offset)
+        except OSError:
+            # The lines are in the log already, so they aren't retried (that would duplicate
+            # them); a gap in the index only sends deletes down the slow path
+            _logger.exception("Activity log index write failed for %s", path)
+            self.reopen()
+
+    def _append_index(self, items: list, offset: int):
+        records = []
+        for _, line, ts_key in items:
+            if len(line) < _TOMBSTONE:
+                records.append(_IDX_RECORD.pack(ts_key, offset, len(line)))
+                if ts_key < self._last_key and not self._idx_flags & _IDX_UNORDERED:
+                    self._idx_flags |= _IDX_UNORDERED
+                    tombstones = _IDX_RECORD.unpack(os.pread(self._idx_fd, _IDX_RECORD.size, 0))[1]
+                    os.pwrite(self._idx_fd, _IDX_RECORD.pack(_IDX_MAGIC, tombstones, self._idx_flags), 0)
+                self._last_key = max(self._last_key, ts_key)
+            offset += len(line)
+        data = b"".join(records)
+        if os.pwrite(self._idx_fd, data, self._idx_end) != len(data):
+            raise OSError("short write to log index")
+        self._idx_end += len(data)
+        # Records are checked against the log before use, so losing some in a crash
+        # only sends a delete down the slow path; the fsync keeps that rare
+        os.fsync(self._idx_fd)
+
+def _read_index_tail(idx_path: str) -> tuple:
+    """(size, header flags, largest key) of an index; (0, 0, 0) if it is missing or invalid."""
+    size = _IDX_RECORD.size
+    try:
+        with open(idx_path, "rb") as f:
+            n = os.fstat(f.fileno()).st_size // size
+            if n == 0:
+                return 0, 0, 0
+            magic, _, flags = _IDX_RECORD.unpack(f.read(size))
+            if magic != _IDX_MAGIC:
+                return 0, 0, 0
+            last_key = 0
+            if n > 1:
+                f.seek((n - 1) * size)
+                last_key = _IDX_RECORD.unpack(f.read(size))[0]
+            return n * size, flags, last_key
+    except FileNotFoundError:
+        return 0, 0, 0
+
+_log_writer = None
+_log_writer_init = threading.Lock()
+
+def _get_log_writer() -> _LogWriter:
+    global _log_writer
+    with _log_writer_init:
+        if _log_writer is None:
+            from config import LOG_DIR
+            _log_writer = _LogWriter(LOG_DIR)
+            atexit.register(_log_writer.flush_and_close)
+    return _log_writer
+
+# Created in LOG_DIR once the legacy log has been split; the legacy file itself is left alone
+LEGACY_LOG_MARKER = ".legacy_imported"
+
+def split_legacy_log():
+    """
+    One-time copy of the single-file log into day buckets. Call once at startup, before logging.
     
-    entry = {
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "user": username,
-        "action": action,
-        "details": str(details) if details else ""
-    }
+    Each day is built in a temp file and renamed into place, and days whose bucket
+    already exists are skipped, so an interrupted split can simply be run again.
+    Lines without a timestamp are dropped.
+    """
+    from config import LOG_FILE, LOG_DIR
     
-    # Append-only (NDJSON format)
-    with open(LOG_FILE, "a") as f:
-        f.write(json.dumps(entry) + "\n")
+    marker = os.path.join(LOG_DIR, LEGACY_LOG_MARKER)
+    if os.path.exists(marker):
+        return
+    try:
+        src = open(LOG_FILE, "rb", buffering=1 << 20)
+    except FileNotFoundError:
+        src = None
+    os.makedirs(LOG_DIR, exist_ok=True)
+    if src is not None:
+        done = {os.path.basename(path)[:10] for path in _log_buckets(LOG_DIR)}
+        days = []
+        day = dst = None
+        try:
+            with src:
+                for line in src:
+                    m = _TS_PREFIX.match(line)
+                    if m:
+                        line_day = b"-".join(m.groups()[:3]).decode("ascii")
+                    else:
+                        try:
+                            timestamp = _json_loads(line).get("timestamp")
+                        except (ValueError, AttributeError):
+                            continue
+                        if _ts_key(timestamp) is None:
+                            continue
+                        line_day = timestamp[:10]
+                    if line_day in done:
+                        continue
+                    # Lines are in time order, so each day is usually opened once
+                    if line_day != day:
+                        if dst is not None:
+                            dst.close()
+                        day = line_day
+                        # Truncate leftovers of an interrupted run the first time a day is seen
+                        dst = open(_bucket_path(LOG_DIR, day) + ".tmp", "ab" if day in days else "wb", buffering=1 << 20)
+                        if day not in days:
+                            days.append(day)
+                    dst.write(line if line.endswith(b"\n") else line + b"\n")
+        finally:
+            if dst is not None:
+                dst.close()
+        for day in days:
+            path = _bucket_path(LOG_DIR, day)
+            fd = os.open(path + ".tmp", os.O_RDONLY | os.O_CLOEXEC)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            os.replace(path + ".tmp", path)
+            _rebuild_log_index(path)
+    with open(marker, "wb"):
+        pass
 
-def delete_log_entries(entries_to_delete: list):
+def flush_logs():
+    """Block until every queued log entry has been written."""
+    if _log_writer is not None:
+        _log_writer.flush()
+
+class _RawJson(str):
+    """Already-serialized JSON text; written into log lines as is, not as a string."""
+
+# Compact, key-sorted form for non-string values; anything JSON can't encode is stored as str()
+_canonical_json = json.JSONEncoder(sort_keys=True, separators=(",", ":"), default=str).encode
+
+def _json_value(value) -> str:
+    if isinstance(value, _RawJson):
+        return value
+    return _json_str(value) if isinstance(value, str) else _canonical_json(value)
+
+def _format_log_line(timestamp, user, action, details) -> bytes:
+    """Exact bytes of one log line; equivalent to json.dumps of the entry with compact separators."""
+    return (
+        f'{{"timestamp":{_json_value(timestamp)},"user":{_json_value(user)},'
+        f'"action":{_json_value(action)},"details":{_json_value(details)}}}\n'
+    ).encode("ascii")
+
+def log_user_action(username: str, action: str, details=None):
+    """Append an entry to the activity log. Non-string details are stored as nested JSON."""
+    t = time.localtime()
+    ts = f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d} {t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}"
+    line = _format_log_line(ts, username, action, "" if details is None else details)
+    _get_log_writer().put(line, ts)
+
+TAIL_BLOCK_SIZE = 64 * 1024
+
+def tail_jsonl(path: str, n: int, keep=None) -> list:
     """
-    Delete specific entries from the log file.
+    Read up to n entries from the end of an NDJSON file, newest first.
     
-    :param entries_to_delete: List of dictionary entries to remove.
+    :param keep: Optional predicate; only matching entries are returned and counted.
     """
-    from config import LOG_FILE
+    entries = []
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return entries
+
+    def take(line: bytes) -> bool:
+        if line.strip():
+            try:
+                entry = _json_loads(line)
+            except ValueError:  # json and orjson decode errors both subclass it
+                return False
+            if keep is None or keep(entry):
+                entries.append(entry)
+        return len(entries) >= n
+
+    with f:
+        pos = f.seek(0, os.SEEK_END)
+        partial = b""
+        while pos > 0:
+            step = min(TAIL_BLOCK_SIZE, pos)
+            pos -= step
+            f.seek(pos)
+            lines = (f.read(step) + partial).split(b"\n")
+            # The first piece may continue in the previous block
+            partial = lines.pop(0)
+            for line in reversed(lines):
+                if take(line):
+                    return entries
+        take(partial)
+    return entries
+
+def tail_logs(n: int, keep=None) -> list:
+    """Read up to n activity log entries across the day buckets, newest first."""
+    from config import LOG_DIR
     
-    if not os.path.exists(LOG_FILE):
-        return
+    entries = []
+    for path in reversed(_log_buckets(LOG_DIR)):
+        entries += tail_jsonl(path, n - len(entries), keep)
+        if len(entries) >= n:
+            break
+    return entries
 
-    # 1. Read all logs
-    all_logs = []
-    with open(LOG_FILE, "r") as f:
-        for line in f:
-            if line.strip():
+def prune_old_logs(days: int):
+    """Delete day buckets older than `days`: one unlink per day, nothing is rewritten."""
+    from config import LOG_DIR
+    
+    cutoff = (date.today() - timedelta(days=days)).isoformat()
+    writer = _get_log_writer()
+    with writer.lock:
+        for path in _log_buckets(LOG_DIR):
+            if os.path.basename(path)[:10] >= cutoff:
+                break
+            for file_path in (path, path + LOG_INDEX_SUFFIX):
                 try:
-                    all_logs.append(json.loads(line))
-                except json.JSONDecodeError:
-                    continue
+                    os.remove(file_path)
+                except FileNotFoundError:
+                    pass
+        writer.reopen()
+
+def _entry_key(entry: dict) -> tuple:
+    """Identity of a log entry: the four fields log_user_action always writes."""
+    details = entry.get("details", "")
+    if not isinstance(details, str):
+        # Containers aren't hashable; their canonical text is, and formats back to the same line
+        details = _RawJson(_canonical_json(details))
+    return (entry.get("timestamp"), entry.get("user"), entry.get("action"), details)
+
+# Up to this many deletions are located by byte search instead of parsing the whole log
+SPLICE_MAX_ENTRIES = 16
+
+# Rewrite the log once this share of its lines are tombstones (and at least LOG_COMPACT_MIN)
+LOG_COMPACT_RATIO = 0.25
+LOG_COMPACT_MIN = 1000
+
+_TS_PREFIX = re.compile(rb'\{"timestamp": ?"(\d{4})-(\d\d)-(\d\d) (\d\d):(\d\d):(\d\d)"')
+# timestamp, user and action at the start of a line, when none of them contain escapes
+_KEY_PREFIX = re.compile(rb'\{"timestamp": ?"([^"\\]*)", ?"user": ?"([^"\\]*)", ?"action": ?"([^"\\]*)"')
+
+def _replace_atomically(path: str, fill):
+    """Write a new version of path with fill(fd) into a temp file, fsync it and rename it over path."""
+    tmp_path = path + ".tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC, 0o644)
+    try:
+        try:
+            fill(fd)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _splice_delete(path: str, keys: set) -> bool:
+    """
+    Remove the lines log_user_action wrote for keys by searching for their exact bytes.
+    
+    Returns False without touching the file if any line can't be found that way
+    (e.g. it was written by an older version), so the caller can fall back to a full scan.
+    """
+    needles = {_format_log_line(*key) for key in keys}
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            cuts = []
+            for needle in needles:
+                found = False
+                pos = mm.find(needle)
+                while pos != -1:
+                    # Only whole lines count
+                    if pos == 0 or mm[pos - 1] == 0x0A:
+                        cuts.append((pos, pos + len(needle)))
+                        found = True
+                    pos = mm.find(needle, pos + len(needle))
+                if not found:
+                    return False
+            cuts.sort()
+
+            def fill(fd):
+                start = 0
+                for pos, end in cuts:
+                    _copy_range(f.fileno(), fd, start, pos - start)
+                    start = end
+                _copy_range(f.fileno(), fd, start, len(mm) - start)
+
+            _replace_atomically(path, fill)
+    return True
+
+def _copy_range(src_fd: int, dst_fd: int, offset: int, count: int):
+    """Append count bytes of src_fd starting at offset to dst_fd, in the kernel where possible."""
+    while count > 0:
+        if hasattr(os, "sendfile"):
+            sent = os.sendfile(dst_fd, src_fd, offset, count)
+        else:
+            data = os.pread(src_fd, min(count, 1 << 20), offset)
+            sent = os.write(dst_fd, data)
+        if sent == 0:
+            break
+        offset += sent
+        count -= sent
+
+def _rebuild_log_index(log_path: str):
+    """Recreate the sidecar index from the log. Call with the writer lock held, then reopen the writer."""
+    def fill(fd):
+        with open(log_path, "rb", buffering=1 << 20) as src, os.fdopen(fd, "wb", buffering=1 << 20, closefd=False) as dst:
+            dst.write(_IDX_RECORD.pack(_IDX_MAGIC, 0, 0))
+            offset = tombstones = ts_key = flags = 0
+            for line in src:
+                m = _TS_PREFIX.match(line)
+                if m and len(line) < _TOMBSTONE:
+                    key = int(b"".join(m.groups()))
+                    if key < ts_key:
+                        flags |= _IDX_UNORDERED
+                    ts_key = max(ts_key, key)
+                    dst.write(_IDX_RECORD.pack(key, offset, len(line)))
+                elif len(line) > 1 and line.startswith(b" ") and len(line) < _TOMBSTONE:
+                    # A line killed by an earlier delete (possibly only its first byte, see
+                    # _index_delete); keyed like its predecessor to keep the order
+                    dst.write(_IDX_RECORD.pack(ts_key, offset, len(line) | _TOMBSTONE))
+                    tombstones += 1
+                offset += len(line)
+            dst.flush()
+            os.pwrite(fd, _IDX_RECORD.pack(_IDX_MAGIC, tombstones, flags), 0)
+
+    _replace_atomically(log_path + LOG_INDEX_SUFFIX, fill)
+
+def _index_delete(log_path: str, keys: set):
+    """
+    Blank out the lines for keys in place, located by binary search on the sidecar index.
     
-    # 2. Filter out deleted logs
-    # Using JSON string representation for easy comparison
-    del_set = {json.dumps(e, sort_keys=True) for e in entries_to_delete}
+    Returns (tombstones, records) after the delete, or None without touching anything
+    if the index is missing or doesn't lead to every key's line.
     
-    new_logs = [e for e in all_logs if json.dumps(e, sort_keys=True) not in del_set]
+    Unlike the other delete paths this doesn't go through _replace_atomically; it relies
+    on single-byte writes not tearing instead. Each line is first killed by overwriting
+    its opening "{" (after which no reader parses it), the log is fsynced, and only then
+    are the rest of the line and the index updated. A crash can leave some of the keys
+    deleted and others not, never a damaged live line.
+    """
+    try:
+        idx = open(log_path + LOG_INDEX_SUFFIX, "r+b")
+    except FileNotFoundError:
+        return None
+    size = _IDX_RECORD.size
+    with idx, open(log_path, "r+b") as log:
+        n = os.fstat(idx.fileno()).st_size // size
+        if n == 0:
+            return None
+        with mmap.mmap(idx.fileno(), n * size) as mm:
+            magic, tombstones, flags = _IDX_RECORD.unpack_from(mm, 0)
+            if magic != _IDX_MAGIC:
+                return None
+            ordered = not flags & _IDX_UNORDERED
+            hits = []
+            for key in keys:
+                ts = _ts_key(key[0])
+                if ts is None:
+                    return None
+                needle = _format_log_line(*key)
+                lo, hi = 1, n
+                while ordered and lo < hi:
+                    mid = (lo + hi) // 2
+                    if _IDX_RECORD.unpack_from(mm, mid * size)[0] < ts:
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                found = False
+                # Unordered: scan every record (still no log parsing)
+                for i in range(lo, n):
+                    rec_ts, offset, length = _IDX_RECORD.unpack_from(mm, i * size)
+                    if rec_ts != ts:
+                        if ordered:
+                            break
+                        continue
+                    # Tombstoned records never match: the flag bit makes the length differ
+                    if length == len(needle) and os.pread(log.fileno(), length, offset) == needle:
+                        hits.append((i, offset, length))
+                        found = True
+                if not found:
+                    return None
+
+            # Tombstone: spaces up to the newline, which every reader skips as a blank line.
+            # The first byte is the commit point; the rest only scrubs the old content.
+            for i, offset, length in hits:
+                os.pwrite(log.fileno(), b" ", offset)
+            os.fsync(log.fileno())
+            for i, offset, length in hits:
+                os.pwrite(log.fileno(), b" " * (length - 2), offset + 1)
+            for i, offset, length in hits:
+                _IDX_RECORD.pack_into(mm, i * size, _IDX_RECORD.unpack_from(mm, i * size)[0], offset, length | _TOMBSTONE)
+            tombstones += len(hits)
+            _IDX_RECORD.pack_into(mm, 0, _IDX_MAGIC, tombstones, flags)
+            mm.flush()
+            os.fsync(log.fileno())
+    return tombstones, n - 1
+
+def _filter_log(log_path: str, fd: int, del_set: set):
+    """Write the lines of log_path whose key isn't in del_set to fd, dropping blank and invalid ones."""
+    # Lines whose leading fields match no deletion are copied without being parsed
+    prefixes = {
+        tuple(field.encode("utf-8") for field in key[:3])
+        for key in del_set
+        if all(isinstance(field, str) for field in key[:3])
+    }
+    with open(log_path, "rb", buffering=1 << 20) as src, os.fdopen(fd, "wb", buffering=1 << 20, closefd=False) as dst:
+        for line in src:
+            if len(line) <= 1:
+                continue  # blank line
+            m = _KEY_PREFIX.match(line)
+            if m and m.groups() not in prefixes:
+                dst.write(line if line.endswith(b"\n") else line + b"\n")
+                continue
+            try:
+                parsed = _json_loads(line)
+            except ValueError:  # json and orjson decode errors both subclass it
+                continue
+            if _entry_key(parsed) not in del_set:
+                dst.write(line if line.endswith(b"\n") else line + b"\n")
+
+def _delete_from_log(log_path: str, del_set: set):
+    """Remove the lines for del_set from one log file. Call with the writer lock held, then reopen the writer."""
+    # The sidecar index is tried first, then byte search, then a streaming pass:
+    # surviving lines are copied verbatim to a temp file, which is fsynced and then
+    # atomically replaces the log. Readers keep seeing the old file until the rename,
+    # and a crash never leaves a truncated log.
+    def fill(fd):
+        _filter_log(log_path, fd, del_set)
+
+    counts = _index_delete(log_path, del_set)
+    if counts is None:
+        if len(del_set) > SPLICE_MAX_ENTRIES or not _splice_delete(log_path, del_set):
+            _replace_atomically(log_path, fill)
+        _rebuild_log_index(log_path)
+    elif counts[0] >= LOG_COMPACT_MIN and counts[0] >= LOG_COMPACT_RATIO * counts[1]:
+        # Compaction: the streaming pass drops the blanked lines
+        _replace_atomically(log_path, fill)
+        _rebuild_log_index(log_path)
+
+def delete_log_entries(entries_to_delete: list):
+    """
+    Delete specific entries from the activity log.
     
-    # 3. Rewrite file
-    with open(LOG_FILE, "w") as f:
-        for entry in new_logs:
-            f.write(json.dumps(entry) + "\n")
\ No newline at end of file
+    :param entries_to_delete: List of dictionary entries to remove.
+    """
+    from config import LOG_DIR
+    
+    writer = _get_log_writer()
+    writer.flush()
+
+    # Compare by field tuple; no per-line serialization needed.
+    # Only the day buckets the entries belong to are touched.
+    by_bucket = {}
+    for entry in entries_to_delete:
+        key = _entry_key(entry)
+        if _ts_key(key[0]) is not None:
+            by_bucket.setdefault(_bucket_path(LOG_DIR, key[0][:10]), set()).add(key)
+
+    with writer.lock:
+        for path, del_set in by_bucket.items():
+            if os.path.exists(path):
+                _delete_from_log(path, del_set)
+        writer.reopen()